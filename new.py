@@ -1,28 +1,52 @@
-import json
 import re
+import bisect
 import datetime
-from flask import Flask, request, render_template_string
-from sqlalchemy import create_engine, Column, Integer, String
-from sqlalchemy.orm import declarative_base, sessionmaker
-import sendgrid
-from sendgrid.helpers.mail import Mail
-import spacy
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, request, Response
+from sqlalchemy import create_engine, Column, Integer, String, DateTime, ForeignKey, select, insert, bindparam, event
+from sqlalchemy.orm import declarative_base, sessionmaker, relationship
+import requests
+from cachetools import TTLCache
 from dateutil import parser as date_parser
 from googleapiclient.discovery import build
 from google.oauth2 import service_account
+from google.auth.transport.requests import AuthorizedSession
+from redis import Redis
+from rq import Queue
+
+# orjson decodes large JSON bodies several times faster than stdlib json.
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    import json
+    _json_loads = json.loads
 
 # Initialize Flask app
 app = Flask(__name__)
 
 # Database setup with SQLAlchemy
 Base = declarative_base()
-engine = create_engine('sqlite:///scheduling.db', echo=True)
+engine = create_engine('sqlite:///scheduling.db', echo=False,
+                       connect_args={'check_same_thread': False},
+                       pool_size=10, pool_pre_ping=False)
 Session = sessionmaker(bind=engine)
 
-# Explicitly create tables
-print("Creating database tables...")
-Base.metadata.create_all(engine)
-print("Tables created.")
+@event.listens_for(engine, 'connect')
+def _set_sqlite_pragmas(dbapi_connection, connection_record):
+    # WAL + synchronous=NORMAL turn the per-commit fsync into a near-append;
+    # a few seconds of durability on OS crash is acceptable for this workload.
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+# Task queue so the inbound-email webhook can return immediately instead of
+# holding the connection open through parsing, calendar and email I/O.
+redis_conn = Redis()
+task_queue = Queue(connection=redis_conn)
 
 class SchedulingRequest(Base):
     __tablename__ = 'scheduling_requests'
@@ -30,23 +54,87 @@ class SchedulingRequest(Base):
     candidate_email = Column(String)
     recruiter_email = Column(String)
     status = Column(String, default='pending')
-    availability = Column(String)  # JSON-encoded list of slots
+    windows = relationship('AvailabilityWindow', order_by='AvailabilityWindow.start')
+
+class AvailabilityWindow(Base):
+    __tablename__ = 'availability_windows'
+    id = Column(Integer, primary_key=True)
+    request_id = Column(Integer, ForeignKey('scheduling_requests.id'))
+    start = Column(DateTime)
+    end = Column(DateTime)
+
+# Explicitly create tables
+Base.metadata.create_all(engine)
+
+# Prepared statement for the single-row lookup on the inbound-email path;
+# the compiled form is cached so each execution skips statement compilation.
+SEL_REQ = select(SchedulingRequest).where(
+    SchedulingRequest.id == bindparam('i')).execution_options(compiled_cache={})
+
 # Email setup with SendGrid
 SENDGRID_API_KEY = 'YOUR_SENDGRID_API_KEY'  # Replace with your SendGrid API key
 SENDER_EMAIL = 'your_email@example.com'     # Replace with your verified sender email
-sg = sendgrid.SendGridAPIClient(api_key=SENDGRID_API_KEY)
+SENDGRID_SEND_URL = 'https://api.sendgrid.com/v3/mail/send'
+
+# One pooled session for all SendGrid sends; the SDK's http client opened a
+# fresh TLS connection per call, this keeps connections alive across sends.
+_http = requests.Session()
 
 def send_email(to, subject, body):
-    message = Mail(
-        from_email=SENDER_EMAIL,
-        to_emails=to,
-        subject=subject,
-        plain_text_content=body
-    )
-    sg.send(message)
+    if isinstance(to, str):
+        to = [to]
+    payload = {
+        'personalizations': [{'to': [{'email': email} for email in to]}],
+        'from': {'email': SENDER_EMAIL},
+        'subject': subject,
+        'content': [{'type': 'text/plain', 'value': body}],
+    }
+    resp = _http.post(SENDGRID_SEND_URL, json=payload,
+                      headers={'Authorization': f'Bearer {SENDGRID_API_KEY}'})
+    resp.raise_for_status()
+
+# Compiled once; matched against every inbound email subject.
+_REQ_ID_RE = re.compile(r'Request #(\d+)')
+
+# Availability parsing with compiled regexes (dates and times in short reply emails)
+DATE_RE = re.compile(r'\b(mon|tue|wed|thu|fri|sat|sun)[a-z]*|\b\d{1,2}/\d{1,2}(?:/\d{2,4})?', re.I)
+TIME_RE = re.compile(r'\b(\d{1,2})(?::(\d{2}))?\s*(am|pm)|\b(morning|afternoon|evening)\b', re.I)
+# Full weekday names and standard abbreviations only; DATE_RE also matches
+# words that merely start with a weekday prefix ("friend", "wedding") and
+# those must not resolve to a date.
+_WEEKDAYS = {
+    'mon': 0, 'monday': 0,
+    'tue': 1, 'tues': 1, 'tuesday': 1,
+    'wed': 2, 'weds': 2, 'wednesday': 2,
+    'thu': 3, 'thur': 3, 'thurs': 3, 'thursday': 3,
+    'fri': 4, 'friday': 4,
+    'sat': 5, 'saturday': 5,
+    'sun': 6, 'sunday': 6,
+}
+_SLASH_DATE = re.compile(r'(\d{1,2})/(\d{1,2})(?:/(\d{2,4}))?$')
+
+def _parse_date_token(token):
+    # Weekday names and m/d[/y] cover virtually all date tokens DATE_RE
+    # emits; dateutil's expensive fuzzy parser is kept only as a fallback.
+    key = token.lower()
+    if key in _WEEKDAYS:
+        today = datetime.date.today()
+        return today + datetime.timedelta(days=(_WEEKDAYS[key] - today.weekday()) % 7)
+    m = _SLASH_DATE.match(token)
+    if m:
+        month, day = int(m.group(1)), int(m.group(2))
+        year = int(m.group(3)) if m.group(3) else datetime.date.today().year
+        if year < 100:
+            year += 2000
+        try:
+            return datetime.date(year, month, day)
+        except ValueError:
+            return None
+    try:
+        return date_parser.parse(token, fuzzy=True, default=datetime.datetime.now()).date()
+    except ValueError:
+        return None
 
-# NLP setup with spaCy
-nlp = spacy.load("en_core_web_sm")
 vague_times = {
     "morning": (8, 0, 12, 0),   # 8 AM - 12 PM
     "afternoon": (13, 0, 17, 0), # 1 PM - 5 PM
@@ -54,42 +142,50 @@ vague_times = {
 }
 
 def parse_availability(text):
-    doc = nlp(text)
+    # Collect date and time matches and walk them in positional order, so a
+    # time is attached to the most recent date mentioned before it.
+    matches = sorted(
+        [(m.start(), 'DATE', m) for m in DATE_RE.finditer(text)] +
+        [(m.start(), 'TIME', m) for m in TIME_RE.finditer(text)]
+    )
     availability = []
     current_date = None
     prev_time = None
 
-    for ent in doc.ents:
-        if ent.label_ == "DATE":
-            try:
-                current_date = date_parser.parse(ent.text, fuzzy=True, default=datetime.datetime.now()).date()
-            except ValueError:
-                current_date = None
-        elif ent.label_ == "TIME":
+    for _, kind, m in matches:
+        if kind == 'DATE':
+            current_date = _parse_date_token(m.group(0))
+        else:
             if current_date:
-                time_text = ent.text.lower()
-                if time_text in vague_times:
-                    start_hour, start_min, end_hour, end_min = vague_times[time_text]
+                vague = m.group(4)
+                if vague:
+                    start_hour, start_min, end_hour, end_min = vague_times[vague.lower()]
                     start_dt = datetime.datetime.combine(current_date, datetime.time(start_hour, start_min))
                     end_dt = datetime.datetime.combine(current_date, datetime.time(end_hour, end_min))
                     availability.append((start_dt, end_dt))
                 else:
-                    try:
-                        time = date_parser.parse(time_text, fuzzy=True).time()
-                        start_dt = datetime.datetime.combine(current_date, time)
-                        if prev_time and prev_time[0] == current_date:
-                            # Handle time range (e.g., "from 10 AM to 12 PM")
-                            end_dt = start_dt
-                            start_dt = prev_time[1]
-                            availability.append((start_dt, end_dt))
-                            prev_time = None
-                        else:
-                            # Single time, assume 1-hour slot
-                            end_dt = start_dt + datetime.timedelta(hours=1)
-                            availability.append((start_dt, end_dt))
-                            prev_time = (current_date, start_dt)
-                    except ValueError:
+                    hour = int(m.group(1))
+                    minute = int(m.group(2) or 0)
+                    meridiem = m.group(3).lower()
+                    if meridiem == 'pm' and hour < 12:
+                        hour += 12
+                    elif meridiem == 'am' and hour == 12:
+                        hour = 0
+                    if hour > 23 or minute > 59:
                         prev_time = None
+                        continue
+                    start_dt = datetime.datetime.combine(current_date, datetime.time(hour, minute))
+                    if prev_time and prev_time[0] == current_date:
+                        # Handle time range (e.g., "from 10 AM to 12 PM")
+                        end_dt = start_dt
+                        start_dt = prev_time[1]
+                        availability.append((start_dt, end_dt))
+                        prev_time = None
+                    else:
+                        # Single time, assume 1-hour slot
+                        end_dt = start_dt + datetime.timedelta(hours=1)
+                        availability.append((start_dt, end_dt))
+                        prev_time = (current_date, start_dt)
             else:
                 prev_time = None
     return availability
@@ -98,75 +194,192 @@ def parse_availability(text):
 SCOPES = ['https://www.googleapis.com/auth/calendar']
 SERVICE_ACCOUNT_FILE = 'service_account.json'  # Path to your service account key
 
-def get_calendar_service(email):
-    credentials = service_account.Credentials.from_service_account_file(
+@functools.lru_cache(maxsize=256)
+def _get_credentials(email):
+    # Re-reading the key file and re-deriving credentials per call is
+    # expensive; credentials are thread-safe, so cache them per email.
+    return service_account.Credentials.from_service_account_file(
         SERVICE_ACCOUNT_FILE, scopes=SCOPES).with_subject(email)
-    return build('calendar', 'v3', credentials=credentials)
 
-def get_free_slots(service, calendar_id, time_min, time_max):
-    body = {
-        "timeMin": time_min.isoformat() + 'Z',
-        "timeMax": time_max.isoformat() + 'Z',
-        "items": [{"id": calendar_id}]
-    }
-    freebusy = service.freebusy().query(body=body).execute()
-    busy_times = freebusy['calendars'][calendar_id]['busy']
-    return [(date_parser.parse(b['start']), date_parser.parse(b['end'])) for b in busy_times]
+@functools.lru_cache(maxsize=256)
+def get_calendar_service(email):
+    return build('calendar', 'v3', credentials=_get_credentials(email), static_discovery=True)
+
+@functools.lru_cache(maxsize=256)
+def get_freebusy_session(email):
+    return AuthorizedSession(_get_credentials(email))
+
+def _parse_rfc3339(value):
+    dt = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return dt.astimezone(datetime.timezone.utc).replace(tzinfo=None)
+
+# Busy intervals cached per (recruiter, calendar, day range) so replies
+# arriving within a few minutes of each other don't re-query Google for the
+# same data. The recruiter email is part of the key because calendar_id is
+# 'primary' for everyone; the calendar's identity is the delegated subject.
+_fb_cache = TTLCache(maxsize=1024, ttl=180)
+
+FREEBUSY_URL = 'https://www.googleapis.com/calendar/v3/freeBusy'
+
+def get_free_slots(fb_session, owner_email, calendar_id, time_min, time_max):
+    key = (owner_email, calendar_id, time_min.date(), time_max.date())
+    busy = _fb_cache.get(key)
+    if busy is None:
+        # Query the full day range so narrower windows can be sliced from cache.
+        day_min = datetime.datetime.combine(time_min.date(), datetime.time.min)
+        day_max = datetime.datetime.combine(time_max.date(), datetime.time.max)
+        body = {
+            "timeMin": day_min.isoformat() + 'Z',
+            "timeMax": day_max.isoformat() + 'Z',
+            "items": [{"id": calendar_id}]
+        }
+        # POSTing directly lets us decode the response body with orjson
+        # instead of the Discovery client's stdlib json.
+        resp = fb_session.post(FREEBUSY_URL, json=body)
+        resp.raise_for_status()
+        freebusy = _json_loads(resp.content)
+        busy_times = freebusy['calendars'][calendar_id]['busy']
+        # Google returns RFC3339 with a Z suffix; normalise to the naive-UTC
+        # datetimes used everywhere else in this module.
+        raw = [(_parse_rfc3339(b['start']), _parse_rfc3339(b['end'])) for b in busy_times]
+        # Fold overlapping/touching entries into a minimal sorted, disjoint set.
+        busy = []
+        for s, e in sorted(raw):
+            if busy and s <= busy[-1][1]:
+                busy[-1] = (busy[-1][0], max(busy[-1][1], e))
+            else:
+                busy.append((s, e))
+        _fb_cache[key] = busy
+    return [(s, e) for s, e in busy if s < time_max and e > time_min]
+
+# Optional Numba acceleration for recruiters with thousands of busy events;
+# the pure-Python sweep below remains the fallback when numba isn't installed.
+try:
+    import numpy as np
+    from numba import njit
+except ImportError:
+    np = None
+else:
+    @njit(cache=True)
+    def _sweep_epochs(avail_start, avail_end, busy_start, busy_end, duration):
+        for w in range(avail_start.shape[0]):
+            free_start = avail_start[w]
+            for i in range(busy_start.shape[0]):
+                if busy_end[i] <= free_start:
+                    continue
+                if busy_start[i] >= avail_end[w]:
+                    break
+                if busy_start[i] - free_start >= duration:
+                    return free_start
+                if busy_end[i] > free_start:
+                    free_start = busy_end[i]
+            if avail_end[w] - free_start >= duration:
+                return free_start
+        return -1
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+def _to_epochs(intervals):
+    starts = [int((s - _EPOCH).total_seconds()) for s, _ in intervals]
+    ends = [int((e - _EPOCH).total_seconds()) for _, e in intervals]
+    return np.asarray(starts, dtype=np.int64), np.asarray(ends, dtype=np.int64)
 
 def find_overlapping_slot(availability, busy_slots, duration_hours=1):
+    # busy_slots must be pre-sorted by start time; the sweep is then a single
+    # linear pass per window with a rolling free_start cursor.
     duration = datetime.timedelta(hours=duration_hours)
+    if np is not None and len(busy_slots) >= 64:
+        avail_s, avail_e = _to_epochs(availability)
+        busy_s, busy_e = _to_epochs(busy_slots)
+        found = _sweep_epochs(avail_s, avail_e, busy_s, busy_e, int(duration.total_seconds()))
+        if found < 0:
+            return None, None
+        start = _EPOCH + datetime.timedelta(seconds=int(found))
+        return start, start + duration
+    busy_ends = [e for _, e in busy_slots]
     for start, end in availability:
-        slot_busy = [b for b in busy_slots if b[0] < end and b[1] > start]
-        if not slot_busy:
-            if (end - start) >= duration:
-                return start, start + duration
-        else:
-            free_start = start
-            for busy_start, busy_end in sorted(slot_busy, key=lambda x: x[0]):
-                if (busy_start - free_start) >= duration:
-                    return free_start, free_start + duration
-                free_start = busy_end
-            if (end - free_start) >= duration:
+        free_start = start
+        # Jump past intervals ending before this window; no per-window lists.
+        i = bisect.bisect_right(busy_ends, start)
+        while i < len(busy_slots):
+            busy_start, busy_end = busy_slots[i]
+            if busy_start >= end:
+                break
+            if (busy_start - free_start) >= duration:
                 return free_start, free_start + duration
+            if busy_end > free_start:
+                free_start = busy_end
+            i += 1
+        if (end - free_start) >= duration:
+            return free_start, free_start + duration
     return None, None
 
-def create_event(service, calendar_id, start, end, attendees):
+def create_event(service, owner_email, calendar_id, start, end, attendees):
     event = {
         'summary': 'Interview',
         'start': {'dateTime': start.isoformat() + 'Z', 'timeZone': 'UTC'},
         'end': {'dateTime': end.isoformat() + 'Z', 'timeZone': 'UTC'},
         'attendees': [{'email': email} for email in attendees],
     }
-    service.events().insert(calendarId=calendar_id, body=event, sendUpdates='all').execute()
+    # Google's own invitation fan-out blocks the insert call; notifications
+    # go out through our SendGrid send instead.
+    service.events().insert(calendarId=calendar_id, body=event, sendUpdates='none').execute()
+    # The new event makes this recruiter's cached busy data for the day stale.
+    for key in [k for k in _fb_cache
+                if k[0] == owner_email and k[1] == calendar_id and k[2] <= start.date() <= k[3]]:
+        _fb_cache.pop(key, None)
 
-def schedule_interview(req):
-    availability = json.loads(req.availability or '[]')
+# Pool for overlapping independent network calls (Google insert, SendGrid send).
+_io_executor = ThreadPoolExecutor(max_workers=4)
+
+def schedule_interview(req, session):
+    # Windows are stored as typed DateTime columns, so no JSON or string
+    # parsing is needed here. The caller's session carries the pending
+    # availability rows; the single commit below covers them and the status
+    # update in one transaction.
+    availability = [(w.start, w.end) for w in req.windows]
     if not availability:
+        session.commit()
         return False
-    availability = [(date_parser.parse(start), date_parser.parse(end)) for start, end in availability]
     service = get_calendar_service(req.recruiter_email)
     calendar_id = 'primary'
     
-    for start, end in availability:
-        busy_slots = get_free_slots(service, calendar_id, start, end)
-        slot_start, slot_end = find_overlapping_slot([(start, end)], busy_slots)
-        if slot_start and slot_end:
-            create_event(service, calendar_id, slot_start, slot_end, [req.recruiter_email, req.candidate_email])
-            req.status = 'scheduled'
-            with Session() as session:
-                session.merge(req)
-                session.commit()
-            send_email(req.candidate_email, f"Interview Scheduled - Request #{req.id}",
-                       f"Your interview is scheduled from {slot_start} to {slot_end} UTC.")
-            return True
-    send_email(req.candidate_email, f"No Available Slots - Request #{req.id}",
-               "We couldn't find a matching slot. Please provide more availability.")
+    # One freebusy query spanning all windows instead of one round trip per window.
+    time_min = min(start for start, _ in availability)
+    time_max = max(end for _, end in availability)
+    busy_slots = get_free_slots(get_freebusy_session(req.recruiter_email), req.recruiter_email,
+                                calendar_id, time_min, time_max)
+
+    # A single call sweeps all windows in order, so busy_ends (and the epoch
+    # arrays on the Numba path) are built once rather than per window.
+    slot_start, slot_end = find_overlapping_slot(availability, busy_slots)
+    if slot_start and slot_end:
+        # The event insert and confirmation email are independent network
+        # calls and run concurrently; the status is only committed once
+        # the insert has succeeded, so a failed insert leaves the request
+        # pending and retryable.
+        event_future = _io_executor.submit(
+            create_event, service, req.recruiter_email, calendar_id, slot_start, slot_end,
+            [req.recruiter_email, req.candidate_email])
+        email_future = _io_executor.submit(
+            send_email, [req.candidate_email, req.recruiter_email],
+            f"Interview Scheduled - Request #{req.id}",
+            f"Your interview is scheduled from {slot_start} to {slot_end} UTC.")
+        event_future.result()
+        req.status = 'scheduled'
+        session.commit()
+        email_future.result()
+        return True
+    # Submit the email first so it overlaps the availability commit.
+    email_future = _io_executor.submit(
+        send_email, req.candidate_email, f"No Available Slots - Request #{req.id}",
+        "We couldn't find a matching slot. Please provide more availability.")
+    session.commit()
+    email_future.result()
     return False
 
-# Flask routes
-@app.route('/')
-def index():
-    html = """
+# Static landing page; no template variables, so Jinja is skipped entirely.
+INDEX_HTML = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -194,35 +407,43 @@ def index():
     </body>
     </html>
     """
-    return render_template_string(html)
+
+# Flask routes
+@app.route('/')
+def index():
+    return Response(INDEX_HTML, mimetype='text/html')
 
 @app.route('/schedule', methods=['POST'])
 def schedule():
     candidate_email = request.form['candidate_email']
     recruiter_email = request.form['recruiter_email']
-    with Session() as session:
-        req = SchedulingRequest(candidate_email=candidate_email, recruiter_email=recruiter_email)
-        session.add(req)
-        session.commit()
-        request_id = req.id
+    with engine.begin() as conn:
+        result = conn.execute(insert(SchedulingRequest.__table__).values(
+            candidate_email=candidate_email, recruiter_email=recruiter_email, status='pending'))
+        request_id = result.inserted_primary_key[0]
     send_email(candidate_email, f"Please provide your availability - Request #{request_id}",
                "Hi, please reply with your available times for the interview (e.g., 'Monday 10 AM to 12 PM').")
     return f"Request #{request_id} created and email sent to {candidate_email}."
 
+def process_incoming(request_id, text):
+    with Session() as session:
+        req = session.execute(SEL_REQ, {"i": request_id}).scalar_one_or_none()
+        if req and req.status == 'pending':
+            session.bulk_save_objects([
+                AvailabilityWindow(request_id=req.id, start=start, end=end)
+                for start, end in parse_availability(text)])
+            schedule_interview(req, session)
+
 @app.route('/incoming_email', methods=['POST'])
 def incoming_email():
     subject = request.form.get('subject', '')
     text = request.form.get('text', '')
-    match = re.search(r'Request #(\d+)', subject)
+    match = _REQ_ID_RE.search(subject)
     if match:
-        request_id = int(match.group(1))
-        with Session() as session:
-            req = session.query(SchedulingRequest).get(request_id)
-            if req and req.status == 'pending':
-                availability = parse_availability(text)
-                req.availability = json.dumps([(start.isoformat(), end.isoformat()) for start, end in availability])
-                session.commit()
-                schedule_interview(req)
+        # Enqueue by dotted path: when this module runs as __main__ the
+        # function object would serialize as __main__.process_incoming,
+        # which a separate rq worker cannot import.
+        task_queue.enqueue('new.process_incoming', int(match.group(1)), text)
     return "OK"
 
 if __name__ == '__main__':